@@ -1,5 +1,6 @@
 import os
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
@@ -31,6 +32,12 @@ def create_app(config_name=None):
     os.makedirs(app.config.get('UPLOAD_FOLDER', 'instance/uploads'), exist_ok=True)
     os.makedirs(app.config.get('BARCODE_FOLDER', 'instance/barcodes'), exist_ok=True)
 
+    # Reuse compiled templates instead of re-parsing them in every new worker
+    bytecode_dir = app.config.get('JINJA_BYTECODE_CACHE_DIR')
+    if bytecode_dir and not app.debug:
+        os.makedirs(bytecode_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(bytecode_dir)
+
     # Register blueprints
     from app.routes.main import main_bp
     from app.routes.auth import auth_bp
@@ -2,6 +2,7 @@
 Job Costing & Profitability Models
 Track true costs and margins on every job
 """
+import zlib
 from datetime import datetime
 from app import db
 
@@ -185,6 +186,68 @@ class LabourRate(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+def quote_costs(quantity, part_weight_g, runner_weight_g, cycle_time_seconds, cavities,
+                material_cost_per_kg, machine_rate_per_hour, labour_rate_per_hour, setup_hours,
+                secondary_ops_cost, overhead_percent, packaging_cost_per_part, target_margin_percent):
+    """Quote cost arithmetic, free of ORM attribute access.
+
+    Arguments follow Quote.COST_INPUT_FIELDS; returns the calculated Quote fields.
+    """
+    # Material cost per part
+    part_weight_kg = (part_weight_g or 0) / 1000
+    runner_weight_kg = (runner_weight_g or 0) / 1000
+    total_shot_weight_kg = part_weight_kg + runner_weight_kg
+    cavities = cavities or 1
+
+    material_cost_per_part = (total_shot_weight_kg / cavities) * (material_cost_per_kg or 0)
+
+    # Cycle cost per part (machine + labour)
+    machine_rate = machine_rate_per_hour or 0
+    labour_rate = labour_rate_per_hour or 0
+    cycle_time_hours = (cycle_time_seconds or 0) / 3600
+    cycle_cost_per_part = (cycle_time_hours * machine_rate + cycle_time_hours * labour_rate) / cavities
+
+    # Setup cost amortized
+    setup_cost = (setup_hours or 0) * (machine_rate + labour_rate)
+    setup_cost_per_part = setup_cost / quantity if quantity and quantity > 0 else 0
+
+    # Total cost per part before overhead
+    direct_cost = (
+        material_cost_per_part +
+        cycle_cost_per_part +
+        setup_cost_per_part +
+        (secondary_ops_cost or 0) +
+        (packaging_cost_per_part or 0)
+    )
+
+    # Overhead
+    overhead_cost_per_part = direct_cost * ((overhead_percent or 0) / 100)
+
+    # Total cost
+    total_cost_per_part = direct_cost + overhead_cost_per_part
+
+    # Selling price with margin
+    margin = target_margin_percent if target_margin_percent is not None else 30
+    if margin <= 0:
+        quoted_price_per_part = total_cost_per_part
+    elif margin < 100:
+        quoted_price_per_part = total_cost_per_part / (1 - margin / 100)
+    else:
+        quoted_price_per_part = total_cost_per_part * 2
+
+    return {
+        'material_cost_per_part': material_cost_per_part,
+        'cycle_cost_per_part': cycle_cost_per_part,
+        'setup_cost': setup_cost,
+        'setup_cost_per_part': setup_cost_per_part,
+        'overhead_cost_per_part': overhead_cost_per_part,
+        'total_cost_per_part': total_cost_per_part,
+        'quoted_price_per_part': quoted_price_per_part,
+        # Total quote value
+        'quoted_total': quoted_price_per_part * (quantity or 0),
+    }
+
+
 class Quote(db.Model):
     """Customer quotes with full cost breakdown"""
     __tablename__ = 'quotes'
@@ -251,6 +314,9 @@ class Quote(db.Model):
     # Converted to order
     sales_order_id = db.Column(db.Integer, db.ForeignKey('sales_orders.id'))
 
+    # Checksum of the inputs used by the last calculate_costs() run
+    cost_inputs_hash = db.Column(db.BigInteger)
+
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -261,55 +327,29 @@ class Quote(db.Model):
     item = db.relationship('Item', backref='quotes')
     sales_order = db.relationship('SalesOrder', backref='quote')
 
-    def calculate_costs(self):
-        """Calculate all cost fields based on inputs"""
-        # Material cost per part
-        part_weight_kg = (self.part_weight_g or 0) / 1000
-        runner_weight_kg = (self.runner_weight_g or 0) / 1000
-        total_shot_weight_kg = part_weight_kg + runner_weight_kg
-        cavities = self.cavities or 1
-
-        self.material_cost_per_part = (total_shot_weight_kg / cavities) * (self.material_cost_per_kg or 0)
-
-        # Cycle cost per part (machine + labour)
-        cycle_time_hours = (self.cycle_time_seconds or 0) / 3600
-        machine_cost_per_cycle = cycle_time_hours * (self.machine_rate_per_hour or 0)
-        labour_cost_per_cycle = cycle_time_hours * (self.labour_rate_per_hour or 0)
-        self.cycle_cost_per_part = (machine_cost_per_cycle + labour_cost_per_cycle) / cavities
-
-        # Setup cost amortized
-        self.setup_cost = (self.setup_hours or 0) * ((self.machine_rate_per_hour or 0) + (self.labour_rate_per_hour or 0))
-        if self.quantity and self.quantity > 0:
-            self.setup_cost_per_part = self.setup_cost / self.quantity
-        else:
-            self.setup_cost_per_part = 0
-
-        # Total cost per part before overhead
-        direct_cost = (
-            self.material_cost_per_part +
-            self.cycle_cost_per_part +
-            self.setup_cost_per_part +
-            (self.secondary_ops_cost or 0) +
-            (self.packaging_cost_per_part or 0)
-        )
-
-        # Overhead
-        self.overhead_cost_per_part = direct_cost * ((self.overhead_percent or 0) / 100)
+    # Fields calculate_costs() reads
+    COST_INPUT_FIELDS = (
+        'quantity', 'part_weight_g', 'runner_weight_g', 'cycle_time_seconds', 'cavities',
+        'material_cost_per_kg', 'machine_rate_per_hour', 'labour_rate_per_hour', 'setup_hours',
+        'secondary_ops_cost', 'overhead_percent', 'packaging_cost_per_part', 'target_margin_percent'
+    )
 
-        # Total cost
-        self.total_cost_per_part = direct_cost + self.overhead_cost_per_part
+    def compute_cost_inputs_hash(self):
+        """Stable checksum of the cost inputs (crc32 so it survives restarts)"""
+        values = tuple(getattr(self, field) for field in self.COST_INPUT_FIELDS)
+        return zlib.crc32(repr(values).encode())
 
-        # Selling price with margin
-        margin = self.target_margin_percent if self.target_margin_percent is not None else 30
-        if margin <= 0:
-            self.quoted_price_per_part = self.total_cost_per_part
-        elif margin < 100:
-            self.quoted_price_per_part = self.total_cost_per_part / (1 - margin / 100)
-        else:
-            self.quoted_price_per_part = self.total_cost_per_part * 2
+    @property
+    def costs_up_to_date(self):
+        """True if calculate_costs() has already run for the current inputs"""
+        return self.cost_inputs_hash is not None and self.cost_inputs_hash == self.compute_cost_inputs_hash()
 
-        # Total quote value
-        self.quoted_total = self.quoted_price_per_part * (self.quantity or 0)
+    def calculate_costs(self):
+        """Calculate all cost fields based on inputs"""
+        inputs = [getattr(self, field) for field in self.COST_INPUT_FIELDS]
+        for field, value in quote_costs(*inputs).items():
+            setattr(self, field, value)
+        self.cost_inputs_hash = self.compute_cost_inputs_hash()
 
     @staticmethod
     def generate_quote_number():
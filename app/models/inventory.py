@@ -102,6 +102,14 @@ class Item(db.Model):
     material = db.relationship('Item', foreign_keys=[material_id], remote_side=[id], backref='parts_using_material')
     masterbatch = db.relationship('Item', foreign_keys=[masterbatch_id], remote_side=[id], backref='parts_using_masterbatch')
 
+    # Indexes backing the quotable-item picker on the quote form
+    __table_args__ = (
+        db.Index('ix_item_quotable', 'is_active', 'item_type'),
+        db.Index('ix_item_has_weight', 'id',
+                 sqlite_where=db.text('part_weight_grams > 0'),
+                 postgresql_where=db.text('part_weight_grams > 0')),
+    )
+
     def __repr__(self):
         return f'<Item {self.sku}: {self.name}>'
 
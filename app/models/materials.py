@@ -11,7 +11,7 @@ class MaterialSupplier(db.Model):
     __tablename__ = 'material_suppliers'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(200), nullable=False)
+    name = db.Column(db.String(200), nullable=False, index=True)
     code = db.Column(db.String(20), unique=True)
 
     # Contact info
@@ -52,6 +52,13 @@ class ShiftLog(db.Model):
     # Operator
     operator_name = db.Column(db.String(100))
 
+    # Stored OEE metrics - set by recalculate() so SQL can aggregate them
+    availability_percent = db.Column(db.Float, default=0)
+    performance_percent = db.Column(db.Float, default=0)
+    quality_percent = db.Column(db.Float, default=0)
+    oee_percent = db.Column(db.Float, default=0)
+    scrap_percent = db.Column(db.Float, default=0)
+
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -60,6 +67,10 @@ class ShiftLog(db.Model):
     machine = db.relationship('Machine', backref='shift_logs')
     production_order = db.relationship('ProductionOrder', backref='shift_logs')
 
+    __table_args__ = (
+        db.Index('ix_shiftlog_date_oee', 'shift_date', 'oee_percent'),
+    )
+
     @property
     def total_downtime_minutes(self):
         """Total unplanned downtime"""
@@ -75,13 +86,6 @@ class ShiftLog(db.Model):
         """Actual operating time"""
         return (self.planned_production_minutes or 0) - self.total_downtime_minutes
 
-    @property
-    def availability_percent(self):
-        """Availability = Operating Time / Planned Production Time"""
-        if not self.planned_production_minutes or self.planned_production_minutes <= 0:
-            return 0
-        return (self.operating_time_minutes / self.planned_production_minutes) * 100
-
     @property
     def theoretical_output(self):
         """How many parts should have been made in operating time"""
@@ -90,36 +94,27 @@ class ShiftLog(db.Model):
         cycles_possible = (self.operating_time_minutes * 60) / self.ideal_cycle_time_seconds
         return cycles_possible * (self.parts_per_cycle or 1)
 
-    @property
-    def performance_percent(self):
-        """Performance = Actual Output / Theoretical Output"""
-        theoretical = self.theoretical_output
-        if theoretical <= 0:
-            return 0
-        return ((self.total_parts_produced or 0) / theoretical) * 100
+    def recalculate(self):
+        """Refresh the stored OEE metrics from the raw shift figures - call before commit"""
+        planned = self.planned_production_minutes or 0
+        total_parts = self.total_parts_produced or 0
 
-    @property
-    def quality_percent(self):
-        """Quality = Good Parts / Total Parts"""
-        if not self.total_parts_produced or self.total_parts_produced <= 0:
-            return 0
-        return ((self.good_parts or 0) / self.total_parts_produced) * 100
+        # Availability = Operating Time / Planned Production Time
+        availability = (self.operating_time_minutes / planned) * 100 if planned > 0 else 0
 
-    @property
-    def oee_percent(self):
-        """OEE = Availability x Performance x Quality"""
-        return (
-            (self.availability_percent / 100) *
-            (self.performance_percent / 100) *
-            (self.quality_percent / 100)
-        ) * 100
+        # Performance = Actual Output / Theoretical Output
+        theoretical = self.theoretical_output
+        performance = (total_parts / theoretical) * 100 if theoretical > 0 else 0
 
-    @property
-    def scrap_percent(self):
-        """Scrap rate percentage"""
-        if not self.total_parts_produced or self.total_parts_produced <= 0:
-            return 0
-        return ((self.scrap_parts or 0) / self.total_parts_produced) * 100
+        # Quality = Good Parts / Total Parts
+        quality = ((self.good_parts or 0) / total_parts) * 100 if total_parts > 0 else 0
+
+        self.availability_percent = availability
+        self.performance_percent = performance
+        self.quality_percent = quality
+        # OEE = Availability x Performance x Quality
+        self.oee_percent = (availability / 100) * (performance / 100) * (quality / 100) * 100
+        self.scrap_percent = ((self.scrap_parts or 0) / total_parts) * 100 if total_parts > 0 else 0
 
 
 class DowntimeReason(db.Model):
@@ -1,4 +1,5 @@
 from datetime import datetime
+from sqlalchemy import event, inspect
 from app import db
 
 
@@ -42,6 +43,14 @@ class Customer(db.Model):
     is_jit = db.Column(db.Boolean, default=False)  # Just-in-time customer
     is_active = db.Column(db.Boolean, default=True)
 
+    # Denormalized count of orders in SalesOrder.OPEN_STATUSES - maintained by
+    # the SalesOrder flush events defined after SalesOrder below
+    open_orders_count = db.Column(db.Integer, nullable=False, default=0)
+
+    # Lowercased "code name contact" for one-column LIKE searches - kept in
+    # step by refresh_search_blob() on every flush
+    search_blob = db.Column(db.Text)
+
     # Xero integration
     xero_contact_id = db.Column(db.String(100))
 
@@ -52,6 +61,14 @@ class Customer(db.Model):
     # Relationships
     orders = db.relationship('SalesOrder', backref='customer', lazy='dynamic')
 
+    # Active customers in list order (name, id) - lets customer_list walk the
+    # index instead of sorting; partial so deactivated customers aren't indexed
+    __table_args__ = (
+        db.Index('ix_customer_active_name', 'name', 'id',
+                 sqlite_where=db.text('is_active = 1'),
+                 postgresql_where=db.text('is_active')),
+    )
+
     def __repr__(self):
         return f'<Customer {self.customer_code}: {self.name}>'
 
@@ -68,6 +85,15 @@ class Customer(db.Model):
         ]
         return '\n'.join(p for p in parts if p)
 
+    @staticmethod
+    def build_search_blob(customer_code, name, contact_name):
+        """search_blob value for the given fields"""
+        return ' '.join((customer_code or '', name or '', contact_name or '')).lower()
+
+    def refresh_search_blob(self):
+        """Rebuild search_blob from the searchable fields"""
+        self.search_blob = Customer.build_search_blob(self.customer_code, self.name, self.contact_name)
+
     @staticmethod
     def generate_customer_code():
         """Generate unique customer code"""
@@ -101,6 +127,9 @@ class SalesOrder(db.Model):
     # Status tracking
     status = db.Column(db.String(30), default='new')  # new, in_production, ready_to_ship, dispatched, delivered, cancelled
 
+    # Statuses that count as an open (not yet shipped) order
+    OPEN_STATUSES = ('new', 'in_production', 'ready_to_ship')
+
     # Financials
     subtotal = db.Column(db.Float, default=0)
     shipping_cost = db.Column(db.Float, default=0)  # Delivery/shipping charge
@@ -158,6 +187,64 @@ class SalesOrder(db.Model):
         return f'SO-{today}-{str(count + 1).zfill(4)}'
 
 
+@event.listens_for(Customer, 'before_insert')
+@event.listens_for(Customer, 'before_update')
+def _customer_before_flush(mapper, connection, customer):
+    customer.refresh_search_blob()
+
+
+def _adjust_open_orders(connection, customer_id, delta):
+    """Add delta to a customer's open_orders_count within the flush"""
+    if not customer_id or not delta:
+        return
+    customers = Customer.__table__
+    connection.execute(
+        customers.update()
+        .where(customers.c.id == customer_id)
+        # Pin updated_at so its onupdate doesn't fire - an order changing
+        # isn't an edit to the customer (and would invalidate its ETag)
+        .values(open_orders_count=customers.c.open_orders_count + delta,
+                updated_at=customers.c.updated_at)
+    )
+
+
+def _is_open(status):
+    return 1 if (status or 'new') in SalesOrder.OPEN_STATUSES else 0
+
+
+@event.listens_for(SalesOrder.status, 'set', active_history=True)
+@event.listens_for(SalesOrder.customer_id, 'set', active_history=True)
+def _order_load_old_value(order, value, oldvalue, initiator):
+    # active_history makes the ORM load the current value before it is
+    # replaced (e.g. on an expired instance after commit), so
+    # _order_updated always sees the real old status/customer in history
+    pass
+
+
+@event.listens_for(SalesOrder, 'after_insert')
+def _order_inserted(mapper, connection, order):
+    _adjust_open_orders(connection, order.customer_id, _is_open(order.status))
+
+
+@event.listens_for(SalesOrder, 'after_update')
+def _order_updated(mapper, connection, order):
+    state = inspect(order)
+    status_hist = state.attrs.status.history
+    customer_hist = state.attrs.customer_id.history
+    if not status_hist.has_changes() and not customer_hist.has_changes():
+        return
+
+    old_status = status_hist.deleted[0] if status_hist.deleted else order.status
+    old_customer = customer_hist.deleted[0] if customer_hist.deleted else order.customer_id
+    _adjust_open_orders(connection, old_customer, -_is_open(old_status))
+    _adjust_open_orders(connection, order.customer_id, _is_open(order.status))
+
+
+@event.listens_for(SalesOrder, 'after_delete')
+def _order_deleted(mapper, connection, order):
+    _adjust_open_orders(connection, order.customer_id, -_is_open(order.status))
+
+
 class SalesOrderLine(db.Model):
     """Sales order line item"""
     __tablename__ = 'sales_order_lines'
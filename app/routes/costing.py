@@ -2,19 +2,148 @@
 Costing & Profitability Routes
 Quoting, job costing, and business intelligence
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, g, current_app
 from flask_login import login_required, current_user
 from datetime import datetime, date, timedelta
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, case
 from app import db
 from app.models.costing import JobCosting, MaterialUsage, MachineRate, LabourRate, Quote, CustomerProfitability
 from app.models.oee import ShiftLog, DowntimeReason, DowntimeEvent, ScrapReason, ScrapEvent
 from app.models.orders import Customer, SalesOrder
 from app.models.production import ProductionOrder, Machine
 from app.models.inventory import Item
+from app.utils.ingest_queue import BatchedInsertQueue
 
 bp = Blueprint('costing', __name__, url_prefix='/costing')
 
+_scrap_queue = BatchedInsertQueue(ScrapEvent.__table__)
+
+
+def _parse_iso_date(value):
+    """Parse a YYYY-MM-DD form value into a date (None if blank)"""
+    return date.fromisoformat(value) if value else None
+
+
+# Quote form fields: (name, type, default when blank or invalid)
+_QUOTE_FIELDS = (
+    ('customer_id', int, None),
+    ('description', str, None),
+    ('quantity', float, 1000),
+    ('annual_volume', float, None),
+    ('part_weight_g', float, None),
+    ('runner_weight_g', float, None),
+    ('cycle_time_seconds', float, None),
+    ('cavities', int, 1),
+    ('material_type', str, None),
+    ('material_cost_per_kg', float, 0),
+    ('machine_rate_per_hour', float, 45),
+    ('labour_rate_per_hour', float, 15),
+    ('setup_hours', float, 2),
+    ('secondary_ops_cost', float, 0),
+    ('overhead_percent', float, 20),
+    ('packaging_cost_per_part', float, 0),
+    ('target_margin_percent', float, 30),
+    ('tooling_cost', float, 0),
+    ('tooling_amortization_qty', float, None),
+    ('valid_until', _parse_iso_date, None),
+    ('notes', str, None),
+    ('internal_notes', str, None),
+)
+
+
+# Shift log form fields, same layout as _QUOTE_FIELDS
+_SHIFT_LOG_FIELDS = (
+    ('planned_production_minutes', float, 480),
+    ('breakdown_minutes', float, 0),
+    ('setup_changeover_minutes', float, 0),
+    ('material_shortage_minutes', float, 0),
+    ('other_downtime_minutes', float, 0),
+    ('downtime_notes', str, None),
+    ('ideal_cycle_time_seconds', float, None),
+    ('parts_per_cycle', int, 1),
+    ('total_parts_produced', int, 0),
+    ('good_parts', int, 0),
+    ('scrap_parts', int, 0),
+    ('rework_parts', int, 0),
+    ('scrap_startup', int, 0),
+    ('scrap_short_shot', int, 0),
+    ('scrap_flash', int, 0),
+    ('scrap_other', int, 0),
+    ('scrap_notes', str, None),
+    ('operator_name', str, None),
+)
+
+
+def _bind_fields(obj, data, fields):
+    """Set typed values from a plain dict of form data onto obj.
+
+    Blank, missing or unparseable values fall back to the field default.
+    """
+    for name, typ, default in fields:
+        value = data.get(name)
+        if value is None or value == '':
+            value = default
+        else:
+            try:
+                value = typ(value)
+            except (TypeError, ValueError):
+                value = default
+        setattr(obj, name, value)
+
+
+def _to_int(value):
+    """int() that returns None for blank or invalid input"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _bind_quote(quote, form):
+    """Copy quote form fields onto a Quote using _QUOTE_FIELDS"""
+    data = form.to_dict()
+    _bind_fields(quote, data, _QUOTE_FIELDS)
+    quote.item_id = _to_int(data.get('item_id')) or None
+
+
+def _quotable_items():
+    """Active items that can be quoted, cached for the current request.
+
+    Finished goods, plus items without a type set but with a part weight.
+    """
+    if 'quotable_items' not in g:
+        g.quotable_items = Item.query.filter(
+            Item.is_active == True,
+            db.or_(
+                Item.item_type.in_(('finished_goods', 'finished_good')),
+                Item.part_weight_grams > 0
+            )
+        ).order_by(Item.sku).all()
+    return g.quotable_items
+
+
+def _oee_averages(logs):
+    """Average the stored OEE metrics over shift logs in a single pass"""
+    count = len(logs)
+    if not count:
+        return {'oee': 0, 'availability': 0, 'performance': 0, 'quality': 0, 'scrap': 0}
+
+    oee = availability = performance = quality = scrap = 0
+    for log in logs:
+        oee += log.oee_percent or 0
+        availability += log.availability_percent or 0
+        performance += log.performance_percent or 0
+        quality += log.quality_percent or 0
+        scrap += log.scrap_percent or 0
+
+    return {
+        'oee': oee / count,
+        'availability': availability / count,
+        'performance': performance / count,
+        'quality': quality / count,
+        'scrap': scrap / count
+    }
+
 
 @bp.before_request
 @login_required
@@ -67,41 +196,8 @@ def quote_list():
 def quote_new():
     """Create new quote"""
     if request.method == 'POST':
-        def get_float(field, default=None):
-            val = request.form.get(field, type=float)
-            return val if val is not None else default
-
-        def get_int(field, default=None):
-            val = request.form.get(field, type=int)
-            return val if val is not None else default
-
-        quote = Quote(
-            quote_number=Quote.generate_quote_number(),
-            customer_id=request.form.get('customer_id', type=int),
-            item_id=request.form.get('item_id', type=int) or None,
-            description=request.form.get('description'),
-            quantity=get_float('quantity', 1000),
-            annual_volume=request.form.get('annual_volume', type=float),
-            part_weight_g=request.form.get('part_weight_g', type=float),
-            runner_weight_g=request.form.get('runner_weight_g', type=float),
-            cycle_time_seconds=request.form.get('cycle_time_seconds', type=float),
-            cavities=get_int('cavities', 1),
-            material_type=request.form.get('material_type'),
-            material_cost_per_kg=get_float('material_cost_per_kg', 0),
-            machine_rate_per_hour=get_float('machine_rate_per_hour', 45),
-            labour_rate_per_hour=get_float('labour_rate_per_hour', 15),
-            setup_hours=get_float('setup_hours', 2),
-            secondary_ops_cost=get_float('secondary_ops_cost', 0),
-            overhead_percent=get_float('overhead_percent', 20),
-            packaging_cost_per_part=get_float('packaging_cost_per_part', 0),
-            target_margin_percent=get_float('target_margin_percent', 30),
-            tooling_cost=get_float('tooling_cost', 0),
-            tooling_amortization_qty=request.form.get('tooling_amortization_qty', type=float),
-            valid_until=datetime.strptime(request.form.get('valid_until'), '%Y-%m-%d').date() if request.form.get('valid_until') else None,
-            notes=request.form.get('notes'),
-            internal_notes=request.form.get('internal_notes'),
-            status='draft'
-        )
+        quote = Quote(quote_number=Quote.generate_quote_number(), status='draft')
+        _bind_quote(quote, request.form)
 
         # Calculate all costs
         quote.calculate_costs()
@@ -113,14 +209,7 @@ def quote_new():
         return redirect(url_for('costing.quote_detail', quote_id=quote.id))
 
     customers = Customer.query.order_by(Customer.name).all()
-    # Get all finished goods items (also include items without type set but with production data)
-    items = Item.query.filter(
-        db.or_(
-            Item.item_type == 'finished_goods',
-            Item.item_type == 'finished_good',
-            db.and_(Item.part_weight_grams.isnot(None), Item.part_weight_grams > 0)
-        )
-    ).filter_by(is_active=True).order_by(Item.sku).all()
+    items = _quotable_items()
 
     # Default rates
     default_machine_rate = 45  # GBP/hour
@@ -149,37 +238,7 @@ def quote_edit(quote_id):
     quote = Quote.query.get_or_404(quote_id)
 
     if request.method == 'POST':
-        def get_float(field, default=None):
-            val = request.form.get(field, type=float)
-            return val if val is not None else default
-
-        def get_int(field, default=None):
-            val = request.form.get(field, type=int)
-            return val if val is not None else default
-
-        quote.customer_id = request.form.get('customer_id', type=int)
-        quote.item_id = request.form.get('item_id', type=int) or None
-        quote.description = request.form.get('description')
-        quote.quantity = get_float('quantity', 1000)
-        quote.annual_volume = request.form.get('annual_volume', type=float)
-        quote.part_weight_g = request.form.get('part_weight_g', type=float)
-        quote.runner_weight_g = request.form.get('runner_weight_g', type=float)
-        quote.cycle_time_seconds = request.form.get('cycle_time_seconds', type=float)
-        quote.cavities = get_int('cavities', 1)
-        quote.material_type = request.form.get('material_type')
-        quote.material_cost_per_kg = get_float('material_cost_per_kg', 0)
-        quote.machine_rate_per_hour = get_float('machine_rate_per_hour', 45)
-        quote.labour_rate_per_hour = get_float('labour_rate_per_hour', 15)
-        quote.setup_hours = get_float('setup_hours', 2)
-        quote.secondary_ops_cost = get_float('secondary_ops_cost', 0)
-        quote.overhead_percent = get_float('overhead_percent', 20)
-        quote.packaging_cost_per_part = get_float('packaging_cost_per_part', 0)
-        quote.target_margin_percent = get_float('target_margin_percent', 30)
-        quote.tooling_cost = get_float('tooling_cost', 0)
-        quote.tooling_amortization_qty = request.form.get('tooling_amortization_qty', type=float)
-        quote.valid_until = datetime.strptime(request.form.get('valid_until'), '%Y-%m-%d').date() if request.form.get('valid_until') else None
-        quote.notes = request.form.get('notes')
-        quote.internal_notes = request.form.get('internal_notes')
+        _bind_quote(quote, request.form)
 
         # Recalculate costs
         quote.calculate_costs()
@@ -190,7 +249,7 @@ def quote_edit(quote_id):
         return redirect(url_for('costing.quote_detail', quote_id=quote.id))
 
     customers = Customer.query.order_by(Customer.name).all()
-    items = Item.query.filter_by(item_type='finished_good').order_by(Item.sku).all()
+    items = _quotable_items()
 
     return render_template('costing/quote_form.html',
                            customers=customers,
@@ -205,8 +264,11 @@ def quote_edit(quote_id):
 def quote_recalculate(quote_id):
     """Recalculate quote costs (AJAX)"""
     quote = Quote.query.get_or_404(quote_id)
-    quote.calculate_costs()
-    db.session.commit()
+
+    # Skip the recalculation and write if nothing has changed since last run
+    if not quote.costs_up_to_date:
+        quote.calculate_costs()
+        db.session.commit()
 
     return jsonify({
         'material_cost_per_part': round(quote.material_cost_per_part, 4),
@@ -240,7 +302,12 @@ def quote_status(quote_id):
 @login_required
 def quote_convert_to_order(quote_id):
     """Convert accepted quote to sales order"""
-    quote = Quote.query.get_or_404(quote_id)
+    # Lock the quote row so concurrent submits can't both convert it
+    quote = Quote.query.filter_by(id=quote_id).with_for_update().first_or_404()
+
+    if quote.sales_order_id:
+        flash(f'Quote {quote.quote_number} has already been converted', 'info')
+        return redirect(url_for('orders.order_detail', order_id=quote.sales_order_id))
 
     if quote.status != 'accepted':
         flash('Only accepted quotes can be converted to orders', 'warning')
@@ -257,8 +324,17 @@ def quote_convert_to_order(quote_id):
     db.session.add(order)
     db.session.flush()
 
-    # Link quote to order
-    quote.sales_order_id = order.id
+    # Link quote to order - guarded so a racing request (e.g. on SQLite, which
+    # has no row locks) finds nothing to update and backs out
+    linked = Quote.query.filter(
+        Quote.id == quote.id,
+        Quote.sales_order_id.is_(None)
+    ).update({Quote.sales_order_id: order.id}, synchronize_session=False)
+    if not linked:
+        db.session.rollback()
+        flash(f'Quote {quote.quote_number} has already been converted', 'info')
+        return redirect(url_for('costing.quote_detail', quote_id=quote_id))
+
     db.session.commit()
 
     flash(f'Created order {order.order_number} from quote', 'success')
@@ -275,17 +351,11 @@ def bi_dashboard():
     month_start = today.replace(day=1)
     year_start = today.replace(month=1, day=1)
 
-    # This month's production orders
-    month_orders = ProductionOrder.query.filter(
-        ProductionOrder.created_at >= month_start
-    ).all()
-
     # Revenue from completed orders this month
-    month_completed = SalesOrder.query.filter(
+    month_revenue = db.session.query(func.sum(SalesOrder.total)).filter(
         SalesOrder.status.in_(['delivered', 'dispatched']),
         SalesOrder.updated_at >= month_start
-    ).all()
-    month_revenue = sum(o.total or 0 for o in month_completed)
+    ).scalar() or 0
 
     # Customer profitability ranking
     customer_stats = db.session.query(
@@ -309,14 +379,18 @@ def bi_dashboard():
 
     # Machine utilization - based on actual in_progress production orders
     machines = Machine.query.filter_by(is_active=True).all()
+    # One grouped count for all machines; machines with no running job are absent
+    running_counts = dict(db.session.query(
+        ProductionOrder.machine_id,
+        func.count(ProductionOrder.id)
+    ).filter(
+        ProductionOrder.status == 'in_progress'
+    ).group_by(ProductionOrder.machine_id).all())
     machine_stats = []
     for m in machines:
-        running_jobs = ProductionOrder.query.filter(
-            ProductionOrder.machine_id == m.id,
-            ProductionOrder.status == 'in_progress'
-        ).count()
+        running_jobs = running_counts.get(m.id, 0)
         # Determine actual status from running jobs, not just machine.status
-        if running_jobs > 0:
+        if m.id in running_counts:
             actual_status = 'running'
         elif m.status == 'maintenance':
             actual_status = 'maintenance'
@@ -328,12 +402,11 @@ def bi_dashboard():
             'status': actual_status
         })
 
-    # Quote conversion rate
-    total_quotes = Quote.query.filter(Quote.created_at >= year_start).count()
-    accepted_quotes = Quote.query.filter(
-        Quote.created_at >= year_start,
-        Quote.status == 'accepted'
-    ).count()
+    # Quote conversion rate - total and accepted counted in one scan
+    total_quotes, accepted_quotes = db.session.query(
+        func.count(Quote.id),
+        func.coalesce(func.sum(case((Quote.status == 'accepted', 1), else_=0)), 0)
+    ).filter(Quote.created_at >= year_start).one()
     conversion_rate = (accepted_quotes / total_quotes * 100) if total_quotes > 0 else 0
 
     # Pending quote value
@@ -452,7 +525,7 @@ def add_machine_rate():
         energy_rate_per_kwh=request.form.get('energy_rate_per_kwh', type=float) or 0.15,
         running_kw=request.form.get('running_kw', type=float) or 0,
         overhead_rate_per_hour=request.form.get('overhead_rate_per_hour', type=float) or 0,
-        effective_from=datetime.strptime(request.form.get('effective_from'), '%Y-%m-%d').date()
+        effective_from=_parse_iso_date(request.form.get('effective_from'))
     )
     db.session.add(rate)
     db.session.commit()
@@ -468,7 +541,7 @@ def add_labour_rate():
         role=request.form.get('role'),
         hourly_rate=request.form.get('hourly_rate', type=float) or 0,
         overtime_multiplier=request.form.get('overtime_multiplier', type=float) or 1.5,
-        effective_from=datetime.strptime(request.form.get('effective_from'), '%Y-%m-%d').date()
+        effective_from=_parse_iso_date(request.form.get('effective_from'))
     )
     db.session.add(rate)
     db.session.commit()
@@ -488,22 +561,27 @@ def oee_dashboard():
 
     machines = Machine.query.filter_by(is_active=True).all()
 
-    # Get today's shift logs for each machine
-    machine_oee = []
-    for machine in machines:
-        today_log = ShiftLog.query.filter_by(
-            machine_id=machine.id,
-            shift_date=today
-        ).first()
-
-        # Get last 7 days average
-        week_logs = ShiftLog.query.filter(
-            ShiftLog.machine_id == machine.id,
+    # Today's shift logs, keyed by machine
+    today_logs = ShiftLog.query.filter_by(shift_date=today).all()
+    today_by_machine = {}
+    for log in today_logs:
+        today_by_machine.setdefault(log.machine_id, log)
+
+    # Week-to-date averages for every machine, aggregated in SQL
+    week_averages = {
+        row.machine_id: row for row in db.session.query(
+            ShiftLog.machine_id,
+            func.avg(ShiftLog.oee_percent).label('oee'),
+            func.avg(ShiftLog.scrap_percent).label('scrap')
+        ).filter(
             ShiftLog.shift_date >= week_start
-        ).all()
+        ).group_by(ShiftLog.machine_id).all()
+    }
 
-        week_oee = sum(log.oee_percent for log in week_logs) / len(week_logs) if week_logs else 0
-        week_scrap = sum(log.scrap_percent for log in week_logs) / len(week_logs) if week_logs else 0
+    machine_oee = []
+    for machine in machines:
+        today_log = today_by_machine.get(machine.id)
+        week_avg = week_averages.get(machine.id)
 
         machine_oee.append({
             'machine': machine,
@@ -512,13 +590,12 @@ def oee_dashboard():
             'today_availability': today_log.availability_percent if today_log else 0,
             'today_performance': today_log.performance_percent if today_log else 0,
             'today_quality': today_log.quality_percent if today_log else 0,
-            'week_oee': week_oee,
-            'week_scrap': week_scrap
+            'week_oee': (week_avg.oee or 0) if week_avg else 0,
+            'week_scrap': (week_avg.scrap or 0) if week_avg else 0
         })
 
     # Overall plant OEE
-    today_logs = ShiftLog.query.filter_by(shift_date=today).all()
-    plant_oee = sum(log.oee_percent for log in today_logs) / len(today_logs) if today_logs else 0
+    plant_oee = _oee_averages(today_logs)['oee']
 
     # Top scrap reasons this month
     scrap_by_reason = db.session.query(
@@ -550,7 +627,7 @@ def oee_log_shift(machine_id):
     """Log shift data for OEE calculation"""
     machine = Machine.query.get_or_404(machine_id)
     log_date = request.args.get('date', date.today().isoformat())
-    log_date = datetime.strptime(log_date, '%Y-%m-%d').date()
+    log_date = _parse_iso_date(log_date)
 
     # Get or create shift log
     shift_log = ShiftLog.query.filter_by(
@@ -564,30 +641,11 @@ def oee_log_shift(machine_id):
             db.session.add(shift_log)
 
         # Update log data
-        shift_log.planned_production_minutes = request.form.get('planned_production_minutes', type=float) or 480
-        shift_log.breakdown_minutes = request.form.get('breakdown_minutes', type=float) or 0
-        shift_log.setup_changeover_minutes = request.form.get('setup_changeover_minutes', type=float) or 0
-        shift_log.material_shortage_minutes = request.form.get('material_shortage_minutes', type=float) or 0
-        shift_log.other_downtime_minutes = request.form.get('other_downtime_minutes', type=float) or 0
-        shift_log.downtime_notes = request.form.get('downtime_notes')
-
-        shift_log.ideal_cycle_time_seconds = request.form.get('ideal_cycle_time_seconds', type=float)
-        shift_log.parts_per_cycle = request.form.get('parts_per_cycle', type=int) or 1
-
-        shift_log.total_parts_produced = request.form.get('total_parts_produced', type=int) or 0
-        shift_log.good_parts = request.form.get('good_parts', type=int) or 0
-        shift_log.scrap_parts = request.form.get('scrap_parts', type=int) or 0
-        shift_log.rework_parts = request.form.get('rework_parts', type=int) or 0
-
-        shift_log.scrap_startup = request.form.get('scrap_startup', type=int) or 0
-        shift_log.scrap_short_shot = request.form.get('scrap_short_shot', type=int) or 0
-        shift_log.scrap_flash = request.form.get('scrap_flash', type=int) or 0
-        shift_log.scrap_other = request.form.get('scrap_other', type=int) or 0
-        shift_log.scrap_notes = request.form.get('scrap_notes')
-
-        shift_log.operator_name = request.form.get('operator_name')
-        shift_log.production_order_id = request.form.get('production_order_id', type=int) or None
+        data = request.form.to_dict()
+        _bind_fields(shift_log, data, _SHIFT_LOG_FIELDS)
+        shift_log.production_order_id = _to_int(data.get('production_order_id')) or None
 
+        shift_log.recalculate()
         db.session.commit()
         flash(f'Shift log saved for {machine.name}', 'success')
         return redirect(url_for('costing.oee_dashboard'))
@@ -619,40 +677,45 @@ def oee_history(machine_id):
     ).order_by(ShiftLog.shift_date.desc()).all()
 
     # Calculate averages
-    if logs:
-        avg_oee = sum(log.oee_percent for log in logs) / len(logs)
-        avg_availability = sum(log.availability_percent for log in logs) / len(logs)
-        avg_performance = sum(log.performance_percent for log in logs) / len(logs)
-        avg_quality = sum(log.quality_percent for log in logs) / len(logs)
-        avg_scrap = sum(log.scrap_percent for log in logs) / len(logs)
-    else:
-        avg_oee = avg_availability = avg_performance = avg_quality = avg_scrap = 0
+    averages = _oee_averages(logs)
 
     return render_template('costing/oee_history.html',
                            machine=machine,
                            logs=logs,
-                           avg_oee=avg_oee,
-                           avg_availability=avg_availability,
-                           avg_performance=avg_performance,
-                           avg_quality=avg_quality,
-                           avg_scrap=avg_scrap)
+                           avg_oee=averages['oee'],
+                           avg_availability=averages['availability'],
+                           avg_performance=averages['performance'],
+                           avg_quality=averages['quality'],
+                           avg_scrap=averages['scrap'])
 
 
 @bp.route('/scrap/log', methods=['POST'])
 @login_required
 def log_scrap():
     """Quick log scrap event"""
-    event = ScrapEvent(
-        machine_id=request.form.get('machine_id', type=int),
-        production_order_id=request.form.get('production_order_id', type=int) or None,
-        reason_id=request.form.get('reason_id', type=int) or None,
-        quantity=request.form.get('quantity', type=int) or 0,
-        weight_kg=request.form.get('weight_kg', type=float),
-        notes=request.form.get('notes'),
-        reported_by=request.form.get('reported_by')
-    )
-    db.session.add(event)
-    db.session.commit()
+    row = {
+        'machine_id': request.form.get('machine_id', type=int),
+        'production_order_id': request.form.get('production_order_id', type=int) or None,
+        'reason_id': request.form.get('reason_id', type=int) or None,
+        'quantity': request.form.get('quantity', type=int) or 0,
+        'weight_kg': request.form.get('weight_kg', type=float),
+        'notes': request.form.get('notes'),
+        'reported_by': request.form.get('reported_by'),
+        'occurred_at': datetime.utcnow()
+    }
+
+    # Shop-floor bursts share one commit via the batched queue; put() only
+    # returns once this row is committed, so success is never premature
+    if current_app.config.get('SCRAP_LOG_BATCHING'):
+        try:
+            _scrap_queue.put(current_app._get_current_object(), row)
+        except Exception:
+            current_app.logger.exception('Scrap log not written')
+            flash('Scrap could not be logged - please try again', 'error')
+            return redirect(request.referrer or url_for('costing.oee_dashboard'))
+    else:
+        db.session.add(ScrapEvent(**row))
+        db.session.commit()
     flash('Scrap logged', 'success')
 
     return redirect(request.referrer or url_for('costing.oee_dashboard'))
@@ -1,28 +1,149 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+import json
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, abort
 from flask_login import login_required, current_user
+from sqlalchemy import func, case, bindparam, insert
 from app import db
 from app.models.orders import Customer, SalesOrder
+from app.utils.cache import TTLCache
+from app.utils.database import has_pg_extension, relax_commit_durability, read_only
 
 customers_bp = Blueprint('customers', __name__)
 
+# Expanding bind so every request reuses one cached statement for the IN list
+_open_statuses = bindparam('open_statuses', value=SalesOrder.OPEN_STATUSES, expanding=True)
+
+# Per-process read caches, cleared on customer writes in this worker
+_search_cache = TTLCache(maxsize=512, ttl=30)    # api_search: lowercased query -> JSON body
+_detail_cache = TTLCache(maxsize=1024, ttl=60)   # api_customer_detail: id -> (etag, payload dict)
+
+
+def _search_filter(term):
+    """LIKE on the pre-lowercased search_blob - one column, one trigram index"""
+    return Customer.search_blob.like(f'%{term.lower()}%')
+
+
+def _search_ranking(term):
+    """ORDER BY for autocomplete - best name match first, then alphabetical"""
+    if has_pg_extension('pg_trgm'):
+        # pg_trgm word similarity, so "acm" ranks "ACME Corp" above "Abacomics Ltd"
+        return (func.word_similarity(term, Customer.name).desc(), Customer.name)
+    # SQLite, or PostgreSQL without pg_trgm (migrate_search_indexes.py not
+    # run) - no trigram functions, so names starting with the term first
+    return (case((Customer.name.like(f'{term}%'), 0), else_=1), Customer.name)
+
+
+# Customer form fields: (name, type, default when missing)
+_CUSTOMER_FIELDS = (
+    ('name', str, ''),
+    ('contact_name', str, ''),
+    ('email', str, ''),
+    ('phone', str, ''),
+    ('address_line1', str, ''),
+    ('address_line2', str, ''),
+    ('city', str, ''),
+    ('county', str, ''),
+    ('postcode', str, ''),
+    ('country', str, 'United Kingdom'),
+    ('credit_terms', int, 30),
+    ('credit_limit', float, None),
+    ('tax_number', str, ''),
+    ('special_requirements', str, ''),
+)
+
+# Only applied when the "different billing address" box is ticked
+_BILLING_FIELDS = (
+    ('billing_address_line1', str, ''),
+    ('billing_address_line2', str, ''),
+    ('billing_city', str, ''),
+    ('billing_county', str, ''),
+    ('billing_postcode', str, ''),
+    ('billing_country', str, ''),
+)
+
+
+def _coerce(value, cast, default):
+    """Strip a form value and cast it; missing or unparseable values give default"""
+    if value is None:
+        return default
+    value = value.strip()
+    if cast is str:
+        return value
+    try:
+        return cast(value)
+    except ValueError:
+        return default
+
+
+def _customer_values(form):
+    """Customer form fields as a column -> value dict"""
+    values = {name: _coerce(form.get(name), cast, default) for name, cast, default in _CUSTOMER_FIELDS}
+    values['is_jit'] = form.get('is_jit') == 'on'
+
+    if form.get('different_billing'):
+        for name, cast, default in _BILLING_FIELDS:
+            values[name] = _coerce(form.get(name), cast, default)
+    return values
+
+
+def _bind_customer(customer, form):
+    """Copy customer form fields onto a Customer"""
+    for name, value in _customer_values(form).items():
+        setattr(customer, name, value)
+
+
+def _invalidate_customer_caches(customer_id=None):
+    """Drop cached API results after a customer is created/changed"""
+    _search_cache.clear()
+    if customer_id is not None:
+        _detail_cache.pop(customer_id)
+
 
 @customers_bp.route('/')
 @login_required
+@read_only
 def customer_list():
     """List all customers"""
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
     search = request.args.get('search', '').strip()
 
-    query = Customer.query.filter_by(is_active=True)
+    # Only the columns the list shows - plain rows, no ORM instances
+    query = Customer.query.with_entities(
+        Customer.id,
+        Customer.customer_code,
+        Customer.name,
+        Customer.city,
+        Customer.is_jit
+    ).filter(Customer.is_active == True)
 
     if search:
-        query = query.filter(db.or_(
-            Customer.customer_code.ilike(f'%{search}%'),
-            Customer.name.ilike(f'%{search}%'),
-            Customer.contact_name.ilike(f'%{search}%')
-        ))
-
-    customers = query.order_by(Customer.name).all()
-    return render_template('customers/list.html', customers=customers, search=search)
+        query = query.filter(_search_filter(search))
+
+    # Capped so a large ?per_page= can't pull the whole table back in
+    pagination = query.order_by(Customer.name, Customer.id).paginate(
+        page=page, per_page=per_page, max_per_page=100, error_out=False)
+
+    # Order counts for the whole page in one grouped query (not one per row)
+    order_counts = {}
+    if pagination.items:
+        order_counts = dict(db.session.query(
+            SalesOrder.customer_id,
+            func.count(SalesOrder.id)
+        ).filter(
+            SalesOrder.customer_id.in_([row.id for row in pagination.items])
+        ).group_by(SalesOrder.customer_id).all())
+
+    # Plain dicts so the template does item lookups rather than attribute access
+    customers = []
+    for row in pagination.items:
+        customer = row._asdict()
+        customer['order_count'] = order_counts.get(row.id, 0)
+        customers.append(customer)
+
+    return render_template('customers/list.html',
+                           customers=customers,
+                           pagination=pagination,
+                           search=search)
 
 
 @customers_bp.route('/new', methods=['GET', 'POST'])
@@ -36,54 +157,47 @@ def customer_create():
             flash('Customer name is required', 'error')
             return render_template('customers/form.html', customer=None)
 
-        customer = Customer(
-            customer_code=Customer.generate_customer_code(),
-            name=name,
-            contact_name=request.form.get('contact_name', '').strip(),
-            email=request.form.get('email', '').strip(),
-            phone=request.form.get('phone', '').strip(),
-            address_line1=request.form.get('address_line1', '').strip(),
-            address_line2=request.form.get('address_line2', '').strip(),
-            city=request.form.get('city', '').strip(),
-            county=request.form.get('county', '').strip(),
-            postcode=request.form.get('postcode', '').strip(),
-            country=request.form.get('country', 'United Kingdom').strip(),
-            credit_terms=request.form.get('credit_terms', 30, type=int),
-            credit_limit=request.form.get('credit_limit', type=float),
-            tax_number=request.form.get('tax_number', '').strip(),
-            special_requirements=request.form.get('special_requirements', '').strip(),
-            is_jit=request.form.get('is_jit') == 'on'
-        )
-
-        # Billing address (if different)
-        if request.form.get('different_billing'):
-            customer.billing_address_line1 = request.form.get('billing_address_line1', '').strip()
-            customer.billing_address_line2 = request.form.get('billing_address_line2', '').strip()
-            customer.billing_city = request.form.get('billing_city', '').strip()
-            customer.billing_county = request.form.get('billing_county', '').strip()
-            customer.billing_postcode = request.form.get('billing_postcode', '').strip()
-            customer.billing_country = request.form.get('billing_country', '').strip()
-
-        db.session.add(customer)
+        values = _customer_values(request.form)
+        values['customer_code'] = Customer.generate_customer_code()
+        values['search_blob'] = Customer.build_search_blob(
+            values['customer_code'], values['name'], values['contact_name'])
+
+        # Core INSERT ... RETURNING: one statement, and no reload of the
+        # expired instance after commit just to read back its id
+        customer_id = db.session.execute(
+            insert(Customer).values(**values).returning(Customer.id)
+        ).scalar_one()
+        relax_commit_durability()
         db.session.commit()
+        _invalidate_customer_caches()
 
-        flash(f'Customer {customer.name} created successfully', 'success')
-        return redirect(url_for('customers.customer_detail', customer_id=customer.id))
+        flash(f'Customer {values["name"]} created successfully', 'success')
+        return redirect(url_for('customers.customer_detail', customer_id=customer_id))
 
     return render_template('customers/form.html', customer=None)
 
 
 @customers_bp.route('/<int:customer_id>')
 @login_required
+@read_only
 def customer_detail(customer_id):
     """View customer details"""
-    customer = Customer.query.get_or_404(customer_id)
-    recent_orders = customer.orders.order_by(SalesOrder.created_at.desc()).limit(10).all()
+    customer = db.get_or_404(Customer, customer_id)
+
+    # Recent orders plus total/pending counts in one query - the window
+    # aggregates are evaluated over all the customer's orders before LIMIT
+    rows = db.session.query(
+        SalesOrder,
+        func.count(SalesOrder.id).over().label('total_orders'),
+        func.count(case((SalesOrder.status.in_(_open_statuses), 1))).over().label('pending_orders')
+    ).filter(
+        SalesOrder.customer_id == customer.id
+    ).order_by(SalesOrder.created_at.desc()).limit(10).all()
+
+    recent_orders = [row.SalesOrder for row in rows]
     order_stats = {
-        'total_orders': customer.orders.count(),
-        'pending_orders': customer.orders.filter(
-            SalesOrder.status.in_(['new', 'in_production', 'ready_to_ship'])
-        ).count()
+        'total_orders': rows[0].total_orders if rows else 0,
+        'pending_orders': rows[0].pending_orders if rows else 0
     }
 
     return render_template('customers/detail.html',
@@ -96,35 +210,14 @@ def customer_detail(customer_id):
 @login_required
 def customer_edit(customer_id):
     """Edit customer"""
-    customer = Customer.query.get_or_404(customer_id)
+    customer = db.get_or_404(Customer, customer_id)
 
     if request.method == 'POST':
-        customer.name = request.form.get('name', '').strip()
-        customer.contact_name = request.form.get('contact_name', '').strip()
-        customer.email = request.form.get('email', '').strip()
-        customer.phone = request.form.get('phone', '').strip()
-        customer.address_line1 = request.form.get('address_line1', '').strip()
-        customer.address_line2 = request.form.get('address_line2', '').strip()
-        customer.city = request.form.get('city', '').strip()
-        customer.county = request.form.get('county', '').strip()
-        customer.postcode = request.form.get('postcode', '').strip()
-        customer.country = request.form.get('country', 'United Kingdom').strip()
-        customer.credit_terms = request.form.get('credit_terms', 30, type=int)
-        customer.credit_limit = request.form.get('credit_limit', type=float)
-        customer.tax_number = request.form.get('tax_number', '').strip()
-        customer.special_requirements = request.form.get('special_requirements', '').strip()
-        customer.is_jit = request.form.get('is_jit') == 'on'
-
-        # Billing address
-        if request.form.get('different_billing'):
-            customer.billing_address_line1 = request.form.get('billing_address_line1', '').strip()
-            customer.billing_address_line2 = request.form.get('billing_address_line2', '').strip()
-            customer.billing_city = request.form.get('billing_city', '').strip()
-            customer.billing_county = request.form.get('billing_county', '').strip()
-            customer.billing_postcode = request.form.get('billing_postcode', '').strip()
-            customer.billing_country = request.form.get('billing_country', '').strip()
+        _bind_customer(customer, request.form)
 
+        relax_commit_durability()
         db.session.commit()
+        _invalidate_customer_caches(customer.id)
         flash(f'Customer {customer.name} updated successfully', 'success')
         return redirect(url_for('customers.customer_detail', customer_id=customer.id))
 
@@ -139,19 +232,19 @@ def customer_delete(customer_id):
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('customers.customer_list'))
 
-    customer = Customer.query.get_or_404(customer_id)
+    customer = db.get_or_404(Customer, customer_id)
 
-    # Check for open orders
-    open_orders = customer.orders.filter(
-        SalesOrder.status.in_(['new', 'in_production', 'ready_to_ship'])
-    ).count()
+    # Check for open orders (maintained counter - no scan of sales_orders)
+    open_orders = customer.open_orders_count or 0
 
     if open_orders > 0:
         flash(f'Cannot delete customer with {open_orders} open orders', 'error')
         return redirect(url_for('customers.customer_detail', customer_id=customer.id))
 
     customer.is_active = False
+    relax_commit_durability()
     db.session.commit()
+    _invalidate_customer_caches(customer.id)
 
     flash(f'Customer {customer.name} has been deactivated', 'success')
     return redirect(url_for('customers.customer_list'))
@@ -160,47 +253,74 @@ def customer_delete(customer_id):
 # API endpoints
 @customers_bp.route('/api/search')
 @login_required
+@read_only
 def api_search():
     """Search customers via API"""
     query = request.args.get('q', '').strip()
+    key = query.lower()
+
+    body = _search_cache.get(key)
+    if body is None:
+        # Only the four columns returned - plain rows, no ORM instances
+        rows = db.session.query(
+            Customer.id,
+            Customer.customer_code,
+            Customer.name,
+            Customer.is_jit
+        ).filter(
+            Customer.is_active == True,
+            _search_filter(query)
+        ).order_by(*_search_ranking(query)).limit(20).all()
+
+        body = json.dumps([row._asdict() for row in rows])
 
-    customers = Customer.query.filter(
-        Customer.is_active == True,
-        db.or_(
-            Customer.customer_code.ilike(f'%{query}%'),
-            Customer.name.ilike(f'%{query}%')
-        )
-    ).limit(20).all()
+        _search_cache.set(key, body)
 
-    return jsonify([{
-        'id': c.id,
-        'customer_code': c.customer_code,
-        'name': c.name,
-        'is_jit': c.is_jit
-    } for c in customers])
+    return current_app.response_class(body, mimetype='application/json')
 
 
 @customers_bp.route('/api/<int:customer_id>')
 @login_required
+@read_only
 def api_customer_detail(customer_id):
     """Get customer details via API"""
-    customer = Customer.query.get_or_404(customer_id)
-
-    return jsonify({
-        'id': customer.id,
-        'customer_code': customer.customer_code,
-        'name': customer.name,
-        'contact_name': customer.contact_name,
-        'email': customer.email,
-        'phone': customer.phone,
-        'address': {
-            'line1': customer.address_line1,
-            'line2': customer.address_line2,
-            'city': customer.city,
-            'county': customer.county,
-            'postcode': customer.postcode,
-            'country': customer.country
-        },
-        'is_jit': customer.is_jit,
-        'credit_terms': customer.credit_terms
-    })
+    # Cheap version probe first - repeat fetches of an unchanged customer get a 304
+    row = db.session.query(Customer.updated_at).filter(Customer.id == customer_id).first()
+    if row is None:
+        abort(404)
+    version = row.updated_at.strftime('%Y%m%d%H%M%S%f') if row.updated_at else '0'
+    etag = f'{customer_id}-{version}'
+
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    cached = _detail_cache.get(customer_id)
+    if cached is not None and cached[0] == etag:
+        payload = cached[1]
+    else:
+        customer = db.get_or_404(Customer, customer_id)
+        payload = {
+            'id': customer.id,
+            'customer_code': customer.customer_code,
+            'name': customer.name,
+            'contact_name': customer.contact_name,
+            'email': customer.email,
+            'phone': customer.phone,
+            'address': {
+                'line1': customer.address_line1,
+                'line2': customer.address_line2,
+                'city': customer.city,
+                'county': customer.county,
+                'postcode': customer.postcode,
+                'country': customer.country
+            },
+            'is_jit': customer.is_jit,
+            'credit_terms': customer.credit_terms
+        }
+        _detail_cache.set(customer_id, (etag, payload))
+
+    response = jsonify(payload)
+    response.set_etag(etag, weak=True)
+    return response
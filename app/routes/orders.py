@@ -432,7 +432,7 @@ def allocate_stock(order_id):
     """Allocate available stock to order lines"""
     order = SalesOrder.query.get_or_404(order_id)
 
-    if order.status not in ['new', 'in_production', 'ready_to_ship']:
+    if order.status not in SalesOrder.OPEN_STATUSES:
         flash('Cannot allocate stock in current status', 'error')
         return redirect(url_for('orders.order_detail', order_id=order.id))
 
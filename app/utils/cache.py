@@ -0,0 +1,53 @@
+"""
+Small in-process caches for hot read paths
+
+Each gunicorn worker holds its own copy, so entries carry a TTL to bound
+how long another worker's write can go unnoticed.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds"""
+
+    _MISSING = object()
+
+    def __init__(self, maxsize=512, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value, or default if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is self._MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries if full"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        """Forget one entry (no error if it isn't cached)"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Forget every entry"""
+        with self._lock:
+            self._data.clear()
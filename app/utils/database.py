@@ -0,0 +1,52 @@
+"""
+Database helpers shared across routes
+"""
+from functools import wraps
+from app import db
+
+
+def is_postgres():
+    """True when the app is running against PostgreSQL rather than SQLite"""
+    return db.engine.dialect.name == 'postgresql'
+
+
+# Extension name -> installed, checked once per process (per database engine)
+_pg_extensions = {}
+
+
+def has_pg_extension(name):
+    """True on PostgreSQL when the named extension (e.g. pg_trgm) is installed"""
+    if not is_postgres():
+        return False
+    key = (str(db.engine.url), name)
+    if key not in _pg_extensions:
+        _pg_extensions[key] = db.session.execute(
+            db.text('SELECT 1 FROM pg_extension WHERE extname = :name'), {'name': name}
+        ).first() is not None
+    return _pg_extensions[key]
+
+
+def relax_commit_durability():
+    """
+    Let the current transaction commit without waiting for the WAL flush
+
+    PostgreSQL only (no-op elsewhere). A server crash may lose the last
+    fraction of a second of such commits, but never corrupts data - only
+    use it for writes that can simply be re-entered.
+    """
+    if is_postgres():
+        db.session.execute(db.text('SET LOCAL synchronous_commit = off'))
+
+
+def read_only(view):
+    """
+    Run a view that never writes with session autoflush switched off
+
+    Skips the pending-change scan SQLAlchemy does before every query; the
+    session is not committed, so nothing is expired either.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        with db.session.no_autoflush:
+            return view(*args, **kwargs)
+    return wrapped
@@ -0,0 +1,106 @@
+"""
+Batched insert queue for high-frequency shop-floor writes
+
+Group commit: rows are handed to a background thread that writes whatever
+has queued up in one transaction, and each caller waits until its own row
+is committed. A burst of submissions shares a commit, but nothing is
+acknowledged before it is in the database - a killed worker can only lose
+rows whose requests haven't been answered yet.
+"""
+import queue
+import threading
+
+from app import db
+
+
+class _PendingRow:
+    """A queued row plus the signal its caller waits on"""
+
+    __slots__ = ('row', 'done', 'error')
+
+    def __init__(self, row):
+        self.row = row
+        self.done = threading.Event()
+        self.error = None
+
+
+class BatchedInsertQueue:
+    """Buffer rows for one table and insert them in batches"""
+
+    def __init__(self, table, max_rows=100, timeout=10):
+        """
+        Args:
+            table: SQLAlchemy Table to insert into (e.g. ScrapEvent.__table__)
+            max_rows: Largest batch written in one transaction
+            timeout: Seconds a caller waits for its row to be committed
+        """
+        self.table = table
+        self.max_rows = max_rows
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._app = None
+
+    def put(self, app, row):
+        """
+        Insert a row (dict of column values), sharing a commit with any
+        rows queued alongside it
+
+        Returns once the row is committed. Raises if it could not be
+        written, or TimeoutError if the writer didn't get to it in time
+        (the row may still be written later).
+        """
+        pending = _PendingRow(row)
+        self._ensure_started(app)
+        self._queue.put(pending)
+        if not pending.done.wait(self.timeout):
+            raise TimeoutError(f'{self.table.name} row not written within {self.timeout}s')
+        if pending.error is not None:
+            raise pending.error
+
+    def _ensure_started(self, app):
+        # Started lazily so each gunicorn worker gets its own thread after fork
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._app = app
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f'ingest-{self.table.name}',
+                daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            # No artificial delay: an idle queue writes a lone row at once,
+            # and rows arriving during a write form the next batch
+            batch = [self._queue.get()]
+            while len(batch) < self.max_rows:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        with self._app.app_context():
+            try:
+                db.session.execute(self.table.insert(), [p.row for p in batch])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                # Retry row by row so one bad row doesn't fail the whole batch
+                for pending in batch:
+                    try:
+                        db.session.execute(self.table.insert(), [pending.row])
+                        db.session.commit()
+                    except Exception as e:
+                        db.session.rollback()
+                        self._app.logger.exception('Failed to insert %s row: %r', self.table.name, pending.row)
+                        pending.error = e
+            finally:
+                db.session.remove()
+                for pending in batch:
+                    pending.done.set()
@@ -22,9 +22,18 @@ class Config:
     UPLOAD_FOLDER = os.path.join(basedir, 'instance', 'uploads')
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
 
+    # CSV uploads at least this big are imported on a background thread
+    BACKGROUND_IMPORT_MIN_BYTES = 1024 * 1024
+
     # Barcode settings
     BARCODE_FOLDER = os.path.join(basedir, 'instance', 'barcodes')
 
+    # Compiled Jinja templates are cached here across worker restarts
+    JINJA_BYTECODE_CACHE_DIR = os.path.join(basedir, 'instance', 'jinja_cache')
+
+    # Group-commit scrap-log inserts via a background writer (see app/utils/ingest_queue.py)
+    SCRAP_LOG_BATCHING = True
+
     # Company settings
     COMPANY_NAME = os.environ.get('COMPANY_NAME') or 'Warehouse Management System'
 
@@ -44,12 +53,18 @@ class ProductionConfig(Config):
     DEBUG = False
     # In production, ensure SECRET_KEY is set via environment variable
 
+    # Templates only change on deploy - don't stat them on every render
+    TEMPLATES_AUTO_RELOAD = False
+
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    SCRAP_LOG_BATCHING = False
+    # Tests render fresh templates - don't write compiled ones into instance/
+    JINJA_BYTECODE_CACHE_DIR = None
 
 
 config = {
@@ -0,0 +1,60 @@
+"""
+Trigram search indexes for PostgreSQL deployments
+Backs the '%term%' customer searches with pg_trgm GIN indexes
+
+Usage: DATABASE_URL=postgresql://... python migrate_search_indexes.py
+SQLite deployments have no trigram support, so this script does nothing there.
+"""
+
+from app import create_app, db
+
+INDEXES = [
+    ("customers_customer_code_trgm",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS customers_customer_code_trgm "
+     "ON customers USING gin (customer_code gin_trgm_ops)"),
+    ("customers_name_trgm",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS customers_name_trgm "
+     "ON customers USING gin (name gin_trgm_ops)"),
+    ("customers_contact_name_trgm",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS customers_contact_name_trgm "
+     "ON customers USING gin (contact_name gin_trgm_ops)"),
+    # Customer.search_blob - the column customer_list and api_search filter on
+    ("customers_search_blob_trgm",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS customers_search_blob_trgm "
+     "ON customers USING gin (search_blob gin_trgm_ops)"),
+    # Superseded by customers_search_blob_trgm
+    ("drop customers_search_trgm",
+     "DROP INDEX CONCURRENTLY IF EXISTS customers_search_trgm"),
+]
+
+
+def run_migrations():
+    app = create_app()
+
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            print(f"  [SKIP] {db.engine.dialect.name} database - trigram indexes are PostgreSQL only")
+            return
+
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            try:
+                conn.execute(db.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                print("  [OK] pg_trgm extension")
+            except Exception as e:
+                print(f"  [ERROR] pg_trgm extension: {e}")
+                return
+
+            for name, sql in INDEXES:
+                try:
+                    conn.execute(db.text(sql))
+                    print(f"  [OK] Index {name}")
+                except Exception as e:
+                    print(f"  [ERROR] Index {name}: {e}")
+
+        print("\nSearch index migration complete!")
+
+
+if __name__ == "__main__":
+    print("Creating search indexes...\n")
+    run_migrations()
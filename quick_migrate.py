@@ -37,6 +37,18 @@ migrations = [
     ("production_orders", "customer_id", "ALTER TABLE production_orders ADD COLUMN customer_id INTEGER REFERENCES customers(id)"),
     # Item default mould
     ("items", "default_mould_id", "ALTER TABLE items ADD COLUMN default_mould_id INTEGER REFERENCES moulds(id)"),
+    # Quote cost input checksum (skips no-op recalculations)
+    ("quotes", "cost_inputs_hash", "ALTER TABLE quotes ADD COLUMN cost_inputs_hash BIGINT"),
+    # Denormalized open order count (backfilled below)
+    ("customers", "open_orders_count", "ALTER TABLE customers ADD COLUMN open_orders_count INTEGER NOT NULL DEFAULT 0"),
+    # Lowercased customer search text (backfilled below)
+    ("customers", "search_blob", "ALTER TABLE customers ADD COLUMN search_blob TEXT"),
+    # Stored OEE metrics (backfilled below)
+    ("shift_logs", "availability_percent", "ALTER TABLE shift_logs ADD COLUMN availability_percent FLOAT"),
+    ("shift_logs", "performance_percent", "ALTER TABLE shift_logs ADD COLUMN performance_percent FLOAT"),
+    ("shift_logs", "quality_percent", "ALTER TABLE shift_logs ADD COLUMN quality_percent FLOAT"),
+    ("shift_logs", "oee_percent", "ALTER TABLE shift_logs ADD COLUMN oee_percent FLOAT"),
+    ("shift_logs", "scrap_percent", "ALTER TABLE shift_logs ADD COLUMN scrap_percent FLOAT"),
 ]
 
 for table, column, sql in migrations:
@@ -53,6 +65,68 @@ for table, column, sql in migrations:
     except Exception as e:
         print(f"  [ERROR] {table}.{column}: {e}")
 
+# Rebuild customer search text (same format as Customer.refresh_search_blob)
+try:
+    cursor.execute("""UPDATE customers SET search_blob = lower(
+        COALESCE(customer_code, '') || ' ' || COALESCE(name, '') || ' ' || COALESCE(contact_name, '')
+    )""")
+    print("  [OK] Rebuilt customers.search_blob")
+except Exception as e:
+    print(f"  [ERROR] customers.search_blob rebuild: {e}")
+
+# Recount open orders per customer (safe to re-run; also repairs any drift)
+try:
+    cursor.execute("""UPDATE customers SET open_orders_count = (
+        SELECT COUNT(*) FROM sales_orders
+        WHERE sales_orders.customer_id = customers.id
+          AND COALESCE(sales_orders.status, 'new') IN ('new', 'in_production', 'ready_to_ship')
+    )""")
+    print("  [OK] Recounted customers.open_orders_count")
+except Exception as e:
+    print(f"  [ERROR] customers.open_orders_count recount: {e}")
+
+# Backfill stored OEE metrics for shift logs saved before they were columns
+# (mirrors ShiftLog.recalculate)
+planned = "COALESCE(planned_production_minutes, 0)"
+operating = (f"({planned} - COALESCE(breakdown_minutes, 0) - COALESCE(setup_changeover_minutes, 0)"
+             " - COALESCE(material_shortage_minutes, 0) - COALESCE(other_downtime_minutes, 0))")
+theoretical = (f"(CASE WHEN ideal_cycle_time_seconds > 0 THEN ({operating} * 60.0 / ideal_cycle_time_seconds)"
+               " * COALESCE(NULLIF(parts_per_cycle, 0), 1) ELSE 0 END)")
+backfill = [
+    f"""UPDATE shift_logs SET
+        availability_percent = CASE WHEN {planned} > 0 THEN {operating} * 100.0 / {planned} ELSE 0 END,
+        performance_percent = CASE WHEN {theoretical} > 0 THEN COALESCE(total_parts_produced, 0) * 100.0 / {theoretical} ELSE 0 END,
+        quality_percent = CASE WHEN total_parts_produced > 0 THEN COALESCE(good_parts, 0) * 100.0 / total_parts_produced ELSE 0 END,
+        scrap_percent = CASE WHEN total_parts_produced > 0 THEN COALESCE(scrap_parts, 0) * 100.0 / total_parts_produced ELSE 0 END
+    WHERE oee_percent IS NULL""",
+    """UPDATE shift_logs SET
+        oee_percent = availability_percent * performance_percent * quality_percent / 10000.0
+    WHERE oee_percent IS NULL""",
+]
+
+try:
+    for sql in backfill:
+        cursor.execute(sql)
+    print("  [OK] Backfilled shift_logs OEE metrics")
+except Exception as e:
+    print(f"  [ERROR] shift_logs OEE backfill: {e}")
+
+# Indexes added to existing tables (create_all only builds them for new tables)
+indexes = [
+    ("ix_item_quotable", "CREATE INDEX IF NOT EXISTS ix_item_quotable ON items (is_active, item_type)"),
+    ("ix_item_has_weight", "CREATE INDEX IF NOT EXISTS ix_item_has_weight ON items (id) WHERE part_weight_grams > 0"),
+    ("ix_shiftlog_date_oee", "CREATE INDEX IF NOT EXISTS ix_shiftlog_date_oee ON shift_logs (shift_date, oee_percent)"),
+    ("ix_customer_active_name", "CREATE INDEX IF NOT EXISTS ix_customer_active_name ON customers (name, id) WHERE is_active = 1"),
+    ("ix_material_suppliers_name", "CREATE INDEX IF NOT EXISTS ix_material_suppliers_name ON material_suppliers (name)"),
+]
+
+for name, sql in indexes:
+    try:
+        cursor.execute(sql)
+        print(f"  [OK] Index {name}")
+    except Exception as e:
+        print(f"  [ERROR] Index {name}: {e}")
+
 conn.commit()
 conn.close()
 print("\nMigration complete! Try running the app now.")
@@ -6,7 +6,7 @@ Run with:
     python run.py
 
 Or for production:
-    gunicorn -w 4 -b 0.0.0.0:5000 "app:create_app()"
+    gunicorn -w 4 --threads 4 -b 0.0.0.0:5000 "app:create_app()"
 """
 
 import os